@@ -1,19 +1,55 @@
-import json
+import asyncio
+import functools
+import hashlib
 import logging
+import orjson
+from diskcache import Cache
 from dotenv import load_dotenv
 from guidance import models, gen
 from icecream import ic
 import dspy
 from dspy.clients.lm import LM
 from dspy import Signature, Assert
-import json
 from tqdm import tqdm  # Import tqdm for progress tracking
 from dspy import Signature, Module, Assert
 import re
 from dspy.primitives.assertions import assert_transform_module, backtrack_handler
 import litellm
+from json_repair import repair_json
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 litellm.suppress_debug_logging = True
 
+# Retry transient provider failures (rate limits, connection drops) with
+# jittered exponential backoff; anything else should surface immediately
+_llm_retry = retry(
+    wait=wait_random_exponential(min=1, max=30),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception_type((litellm.RateLimitError, litellm.APIConnectionError, TimeoutError))
+)
+
+# Compiled once at import; clean_options strips this from every option of
+# every generated question
+_LETTER_PREFIX = re.compile(r'^[A-D]\.\s*')
+
+# One match per generated fact line: captures the "(subject)" prefix and
+# the fact text in a single pass
+_FACT_RE = re.compile(r'^\(([^)]+)\)\s*(.+)$')
+
+# Keys every generated question must carry; frozenset so the validation
+# pass is a single C-level set difference per question
+_REQUIRED_KEYS = frozenset({'question', 'options', 'correct_answer', 'subject'})
+
+@functools.lru_cache(maxsize=8)
+def _get_lm(model_name, max_tokens):
+    """LM construction is non-trivial; share one instance per configuration."""
+    return dspy.LM(model_name, max_tokens=max_tokens)
+
+@functools.lru_cache(maxsize=4)
+def _load_prompt(file_path):
+    """Read a prompt file once per path; later extractors reuse the cached text."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return file.read()
+
 class MedFactsExtractor:
     def __init__(
         self,
@@ -50,9 +86,14 @@ class MedFactsExtractor:
     @staticmethod
     def load_markdown_file(file_path):
         """Load the contents of a markdown file into a variable."""
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
+        return _load_prompt(file_path)
     
+    @_llm_retry
+    def _generate_facts(self, text_corpus):
+        """Run the fact-extraction generation; retried with backoff on 429/5xx."""
+        self.lllm += f"The following is the text to convert into facts: {text_corpus}. Output only the facts, no other text." + gen(name="facts")
+        return self.lllm["facts"]
+
     def process_text_to_facts(self, text_corpus):
         """
         Process input text into JSON-encoded facts using the LLM.
@@ -62,31 +103,20 @@ class MedFactsExtractor:
         if not self.system_prompt:
             raise ValueError("System prompt is not loaded. Provide a valid prompt file path.")
 
-        # Add input text to the model
-        self.lllm += f"The following is the text to convert into facts: {text_corpus}. Output only the facts, no other text." + gen(name="facts")
-        
-        # Extract the generated facts
-        facts = self.lllm["facts"]
+        # Generate the facts (retried on transient provider failures)
+        facts = self._generate_facts(text_corpus)
         ic(facts)
         
-        # Parse the facts into JSON format
-        facts_list = facts.split('\n')
-        facts_json = []
-        
-        for fact in facts_list:
-            if fact.strip():  # Ensure the fact is not empty
-                subject_start = fact.find('(') + 1
-                subject_end = fact.find(')')
-                subject = fact[subject_start:subject_end]
-                fact_text = fact[subject_end + 2:]  # Skip the closing parenthesis and space
-                
-                facts_json.append({
-                    "subject": subject,
-                    "fact": fact_text
-                })
-        
+        # Parse the facts into JSON format: one regex match per line instead
+        # of repeated find()/slice calls
+        facts_json = [
+            {"subject": m.group(1), "fact": m.group(2)}
+            for line in facts.splitlines()
+            if (m := _FACT_RE.match(line.strip()))
+        ]
+
         # Return the JSON string
-        return json.dumps(facts_json, indent=4)
+        return orjson.dumps(facts_json, option=orjson.OPT_INDENT_2).decode()
 
 class MCQSignature(Signature):
     """Generate a USMLE style MCQA and right answer reasoning from a given text. 
@@ -94,18 +124,48 @@ class MCQSignature(Signature):
     text = dspy.InputField(desc="The text(subject) to generate MCQs from.")
     questions = dspy.OutputField(desc="The generated MCQs in JSON format. Options should not include letter prefixes.")
 
+class BatchMCQSignature(Signature):
+    """Generate USMLE style MCQAs and right answer reasoning for several numbered subject/fact pairs in one pass.
+    Answers should be plain text without any letter designations (A, B, C, D)."""
+    facts = dspy.InputField(desc="Numbered list of subject/fact pairs to generate MCQs from.")
+    results = dspy.OutputField(desc='The generated MCQs in JSON format: {"results": [{"index": i, "questions": [...]}]}. Options should not include letter prefixes.')
+
 class MCQModule(Module):
-    def __init__(self, model_name="openai/gpt-4o-mini", max_tokens=1000):
+    def __init__(self, model_name="openai/gpt-4o-mini", max_tokens=1000, cache_dir="./.mcq_cache"):
         super().__init__()
-        
-        # Configure the language model
-        turbo = dspy.LM(model_name, max_tokens=max_tokens)
-        dspy.configure(lm=turbo)
-        
+
+        self.model_name = model_name
+
+        # Use a shared LM per (model, max_tokens) and scope it to this
+        # module's calls instead of mutating the global dspy settings, so
+        # several MCQModules can coexist without overwriting each other
+        self._lm = _get_lm(model_name, max_tokens)
+
         # Configure backtracking parameters
         dspy.settings.configure(backtrack_handler=backtrack_handler)
-        
+
         self.prog = dspy.Predict(MCQSignature)
+        self.batch_prog = dspy.Predict(BatchMCQSignature)
+
+        # Persistent response cache so re-runs over overlapping corpora
+        # skip the LLM call entirely
+        self.cache = Cache(cache_dir)
+
+    def _cache_key(self, text):
+        """Cache key for a prompt: responses are model-specific, so hash both."""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode()).hexdigest()
+
+    @_llm_retry
+    def _predict(self, text):
+        """Single-fact predict; retried with backoff on transient failures."""
+        with dspy.context(lm=self._lm):
+            return self.prog(text=text)
+
+    @_llm_retry
+    def _predict_batch(self, facts_prompt):
+        """Batched predict; retried with backoff on transient failures."""
+        with dspy.context(lm=self._lm):
+            return self.batch_prog(facts=facts_prompt)
 
     def normalize_json_structure(self, questions_json):
         """Normalize the JSON structure to ensure consistent format"""
@@ -119,21 +179,27 @@ class MCQModule(Module):
                 question['correct_answer'] = question.pop('answer')
             
             # Ensure all required keys exist
-            required_keys = {'question', 'options', 'correct_answer', 'subject'}
-            for key in required_keys:
-                if key not in question:
-                    if key == 'subject':
-                        # Subject will be added later in forward()
-                        continue
-                    print(f"Missing required key: {key}")
-                    question[key] = ''  # Add empty placeholder
+            for key in _REQUIRED_KEYS - question.keys():
+                if key == 'subject':
+                    # Subject will be added later in forward()
+                    continue
+                print(f"Missing required key: {key}")
+                question[key] = ''  # Add empty placeholder
 
         return questions_json
 
     def forward(self, text):
-        response = self.prog(text=text)
+        # Cache hit: a dict lookup replaces a multi-second network call
+        key = self._cache_key(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return orjson.loads(cached)
+
+        response = self._predict(text)
         try:
-            questions_json = json.loads(response.questions)
+            # repair_json salvages near-JSON output (trailing commas, single
+            # quotes) so the LLM spend isn't wasted on a formatting slip
+            questions_json = orjson.loads(repair_json(response.questions))
             
             # Extract subject from input text
             subject = text.split('Subject: ')[1].split('.')[0] if 'Subject: ' in text else ''
@@ -146,21 +212,82 @@ class MCQModule(Module):
             self.normalize_json_structure(questions_json)
             self.clean_options(questions_json)
             self.validate_json_structure(questions_json)
+            self.cache.set(key, orjson.dumps(questions_json))
             return questions_json
-        except json.JSONDecodeError:
-            print("Failed to decode JSON. Please check the output format.")
+        except orjson.JSONDecodeError:
+            print(f"Failed to decode JSON even after repair. Raw output: {response.questions}")
             return {}
 
+    async def aforward(self, text):
+        """
+        Async counterpart of forward for concurrent MCQ generation.
+        dspy.Predict is blocking, so the call runs in a worker thread and
+        the event loop is free to dispatch the other pending facts.
+        """
+        return await asyncio.to_thread(self.forward, text)
+
+    def forward_batch(self, facts):
+        """
+        Generate MCQs for a list of subject/fact dicts in a single LLM request.
+
+        Batching K facts into one numbered prompt cuts the request count by K
+        and amortizes the instruction tokens across the whole batch.
+
+        :param facts: List of dicts with 'subject' and 'fact' keys.
+        :return: Flat list of generated question dicts.
+        """
+        prompt = "\n".join(
+            f"{i}. Subject: {fact['subject']}. Fact: {fact['fact']}"
+            for i, fact in enumerate(facts)
+        )
+
+        key = self._cache_key(prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return orjson.loads(cached)
+
+        response = self._predict_batch(prompt)
+        try:
+            results_json = orjson.loads(repair_json(response.results))
+        except orjson.JSONDecodeError:
+            print(f"Failed to decode JSON even after repair. Raw output: {response.results}")
+            return []
+
+        all_questions = []
+        for entry in results_json.get('results', []):
+            # Map each result back to its input fact to recover the subject
+            index = entry.get('index')
+            if isinstance(index, int) and 0 <= index < len(facts):
+                subject = facts[index]['subject']
+            else:
+                subject = ''
+
+            questions_json = {'questions': entry.get('questions', [])}
+            for question in questions_json['questions']:
+                question['subject'] = subject
+
+            self.normalize_json_structure(questions_json)
+            self.clean_options(questions_json)
+            self.validate_json_structure(questions_json)
+            all_questions.extend(questions_json['questions'])
+
+        self.cache.set(key, orjson.dumps(all_questions))
+        return all_questions
+
+    async def aforward_batch(self, facts):
+        """Async counterpart of forward_batch; see aforward."""
+        return await asyncio.to_thread(self.forward_batch, facts)
+
     def clean_options(self, questions_json):
         """Clean options and correct answer of letter designators"""
         for question in questions_json.get('questions', []):
             # Clean options
-            cleaned_options = [re.sub(r'^[A-D]\.\s*', '', option.strip()) for option in question.get('options', [])]
+            cleaned_options = [_LETTER_PREFIX.sub('', option.strip()) for option in question.get('options', [])]
             question['options'] = cleaned_options
-            
+
             # Clean correct answer
             if 'correct_answer' in question:
-                question['correct_answer'] = re.sub(r'^[A-D]\.\s*', '', question['correct_answer'].strip())
+                question['correct_answer'] = _LETTER_PREFIX.sub('', question['correct_answer'].strip())
 
     def validate_json_structure(self, questions_json):
         # Update validation to include subject
@@ -174,12 +301,11 @@ class MCQModule(Module):
                 if not isinstance(question, dict):
                     print(f"Invalid question format: {question}")
                     return False
-                # Add 'subject' to required keys
-                required_keys = {'question', 'options', 'correct_answer', 'subject'}
-                for key in required_keys:
-                    if key not in question:
-                        print(f"Missing '{key}' key in: {question}")
-                        return False
+                # One set difference replaces the per-key membership loop
+                missing = _REQUIRED_KEYS - question.keys()
+                if missing:
+                    print(f"Missing {sorted(missing)} key(s) in: {question}")
+                    return False
             return True
 
         is_valid = is_valid_structure(questions)
@@ -203,7 +329,7 @@ def main():
     print(json_output)
 
     # Parse the JSON string into a Python list of dictionaries
-    facts_list = json.loads(json_output)
+    facts_list = orjson.loads(json_output)
 
     # Process each fact to generate MCQs
     all_questions = []  # List to store all questions
@@ -220,14 +346,14 @@ def main():
             all_questions.extend(response['questions'])
         
         # Output the generated MCQs in JSON format
-        print(json.dumps(response, indent=4))
+        print(orjson.dumps(response, option=orjson.OPT_INDENT_2).decode())
 
     # Create final response structure
     final_response = {'questions': all_questions}
 
     # Save all responses to a JSON file
-    with open('mcq_responses.json', 'w') as json_file:
-        json.dump(final_response, json_file, indent=4)
+    with open('mcq_responses.json', 'wb') as json_file:
+        json_file.write(orjson.dumps(final_response, option=orjson.OPT_INDENT_2))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,5 +1,6 @@
-import json
+import asyncio
 import logging
+import orjson
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
@@ -28,14 +29,15 @@ from helper.web_gateway.image_capture import ImageCaptureGateway
 logging.getLogger('LiteLLM').setLevel(logging.CRITICAL)
 
 class Collector:
-    def __init__(self, database_url, model_name="gpt-4o", media_model="ollama/llava"):
+    def __init__(self, database_url, model_name="gpt-4o", media_model=None):
         """
         Initialize the Collector class.
 
         Parameters:
         - database_url (str): The database connection URL.
         - model_name (str): The name of the language model to use for text processing.
-        - media_model (str): The name of the model to use for media processing.
+        - media_model (str): The name of the model to use for media processing,
+          or None for text-only collection.
         """
         # Setup logging
         logging.basicConfig(
@@ -52,7 +54,33 @@ class Collector:
         # Initialize components
         self.extractor = MedFactsExtractor(model_name)
         self.mcq_module = MCQModule()
-        self.media_processor = MediaBatchProcessor(model=media_model)
+        self.media_processor = MediaBatchProcessor(model=media_model) if media_model else None
+
+    async def _generate_mcqs(self, facts_list, batch_size=8, max_concurrency=20):
+        """
+        Generate MCQs for all facts concurrently, several facts per request.
+
+        Facts are grouped into chunks so each LLM request covers batch_size
+        facts, and the chunks are submitted together, bounded by a semaphore
+        to respect provider rate limits.
+
+        Parameters:
+        - facts_list (list): List of fact dicts with 'subject' and 'fact' keys.
+        - batch_size (int): Number of facts to pack into one LLM request.
+        - max_concurrency (int): Maximum number of in-flight LLM requests.
+
+        Returns:
+        - list: Per-chunk question lists (or exceptions) in input order.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def generate(chunk):
+            async with semaphore:
+                return await self.mcq_module.aforward_batch(chunk)
+
+        chunks = [facts_list[i:i + batch_size] for i in range(0, len(facts_list), batch_size)]
+        tasks = [generate(chunk) for chunk in chunks]
+        return await asyncio.gather(*tasks, return_exceptions=True)
 
     def process_and_ingest(self, text_corpus):
         """
@@ -63,15 +91,17 @@ class Collector:
         """
         # Generate facts from the text corpus
         json_output = self.extractor.process_text_to_facts(text_corpus)
-        facts_list = json.loads(json_output)
+        facts_list = orjson.loads(json_output)
+
+        # Generate MCQs from all facts concurrently (network-bound LLM calls)
+        responses = asyncio.run(self._generate_mcqs(facts_list))
 
-        # Generate MCQs from facts
         all_questions = []
-        for fact in facts_list:
-            input_text = f"Subject: {fact['subject']}. Fact: {fact['fact']}"
-            response = self.mcq_module.forward(input_text)
-            if 'questions' in response:
-                all_questions.extend(response['questions'])
+        for response in responses:
+            if isinstance(response, Exception):
+                self.logger.error(f"MCQ generation failed for a batch of facts: {response}")
+                continue
+            all_questions.extend(response)
 
         print(all_questions)
 
@@ -83,41 +113,44 @@ class Collector:
         session = self.SessionLocal()
         try:
             ingest = Ingest(session)
-            all_questions_json = []  # List to hold all question JSONs
-            for question in processed_data:
-                all_questions_json.append(question)
-                ingest.ingest_single(question)
-
-            # Create table data from the questions
-            table_data = [[
-                q.get('question_text', ''),
-                # Parse JSON string of options if needed, otherwise join the list directly
-                ', '.join(json.loads(q.get('options')) if isinstance(q.get('options'), str) else q.get('options', [])),
-                q.get('correct_option', ''),
-                q.get('subject', ''),
-                q.get('sub_subject', ''),
-                q.get('difficulty', ''),
-                q.get('reasoning', ''),
-                datetime.datetime.utcnow(),
-                datetime.datetime.utcnow()
-            ] for q in all_questions_json]
-
-            # Define headers for the table
-            headers = [
-                'Question Text', 
-                'Options', 
-                'Correct Option', 
-                'Subject',
-                'Sub Subject',
-                'Difficulty',
-                'Reasoning',
-                'Created At',
-                'Updated At'
-            ]
-            
-            # Display the table
-            print("\nGenerated Questions:")
-            print(tabulate(table_data, headers=headers, tablefmt='grid'))
+            # Single bulk upsert instead of one INSERT+SELECT per question
+            ingest.ingest_many(processed_data)
+
+            # Rendering the ASCII grid is O(rows x cols) string work for a
+            # debug aid; skip building the table entirely unless debugging
+            if self.logger.isEnabledFor(logging.DEBUG):
+                # Create table data from the questions (one clock read for the
+                # whole table; utcnow() is deprecated in 3.12+)
+                now = datetime.datetime.now(datetime.UTC)
+                table_data = [[
+                    q.get('question_text', ''),
+                    # Parse JSON string of options if needed, otherwise join the list directly
+                    ', '.join(orjson.loads(q.get('options')) if isinstance(q.get('options'), str) else q.get('options', [])),
+                    q.get('correct_option', ''),
+                    q.get('subject', ''),
+                    q.get('sub_subject', ''),
+                    q.get('difficulty', ''),
+                    q.get('reasoning', ''),
+                    now,
+                    now
+                ] for q in processed_data]
+
+                # Define headers for the table
+                headers = [
+                    'Question Text',
+                    'Options',
+                    'Correct Option',
+                    'Subject',
+                    'Sub Subject',
+                    'Difficulty',
+                    'Reasoning',
+                    'Created At',
+                    'Updated At'
+                ]
+
+                # Display the table
+                print("\nGenerated Questions:")
+                print(tabulate(table_data, headers=headers, tablefmt='grid'))
 
             session.commit()
             self.logger.info("All questions ingested successfully.")
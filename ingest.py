@@ -1,7 +1,8 @@
 # ingest.py
-import json
+import orjson
 import datetime
 import logging
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from models import Question
@@ -30,44 +31,70 @@ class Ingest:
         Returns:
         - None
         """
-        try:
-            # Check for mandatory fields
-            if not all([
-                question_data.get('question_text'),
-                question_data.get('options'),
-                question_data.get('correct_option')
-            ]):
-                self.logger.warning(f"Missing mandatory fields in question: {question_data}")
-                return
+        self.ingest_many([question_data])
+
+    def ingest_many(self, questions):
+        """
+        Ingest multiple MCQs into the PostgreSQL database in a single round-trip.
+
+        Duplicates are skipped by the database itself via the unique constraint
+        on question_text (INSERT ... ON CONFLICT DO NOTHING), so no per-row
+        duplicate SELECT is needed.
 
-            # Check for duplicate based on question_text
-            existing_question = self.session.query(Question).filter_by(
-                question_text=question_data['question_text']
-            ).first()
-            
-            if existing_question:
-                self.logger.info(f"Duplicate found. Skipping question: {question_data['question_text']}")
+        Parameters:
+        - questions (list of dict): Dictionaries containing the MCQ data.
+
+        Returns:
+        - None
+        """
+        try:
+            now = datetime.datetime.utcnow()
+            rows = []
+            for question_data in questions:
+                # Check for mandatory fields
+                if not all([
+                    question_data.get('question_text'),
+                    question_data.get('options'),
+                    question_data.get('correct_option')
+                ]):
+                    self.logger.warning(f"Missing mandatory fields in question: {question_data}")
+                    continue
+
+                # Store options as JSON string (accept pre-serialized strings as-is)
+                options = question_data['options']
+                if not isinstance(options, str):
+                    options = orjson.dumps(options).decode()
+
+                rows.append({
+                    'question_text': question_data['question_text'],
+                    'options': options,
+                    'correct_option': question_data['correct_option'],
+                    'subject': question_data.get('subject'),
+                    'sub_subject': question_data.get('sub_subject'),
+                    'difficulty': question_data.get('difficulty'),
+                    'reasoning': question_data.get('reasoning'),
+                    'created_at': now,
+                    'updated_at': now
+                })
+
+            if not rows:
+                self.logger.warning("No complete questions to ingest.")
                 return
 
-            # Create a new Question instance
-            new_question = Question(
-                question_text=question_data['question_text'],
-                options=json.dumps(question_data['options']),  # Store options as JSON string
-                correct_option=question_data['correct_option'],
-                subject=question_data.get('subject'),
-                sub_subject=question_data.get('sub_subject'),
-                difficulty=question_data.get('difficulty'),
-                reasoning=question_data.get('reasoning'),
-                created_at=datetime.datetime.utcnow(),
-                updated_at=datetime.datetime.utcnow()
+            # Single bulk upsert; the unique index on question_text drops duplicates
+            stmt = insert(Question).values(rows).on_conflict_do_nothing(
+                index_elements=['question_text']
             )
+            self.session.execute(stmt)
+            self.session.commit()
+            self.logger.info(f"Ingested {len(rows)} questions in one bulk upsert.")
 
-            # Add the new question to the session
-            self.session.add(new_question)
-            self.logger.debug(f"Added question to session: {question_data['question_text']}")
-
+        except SQLAlchemyError as sae:
+            self.session.rollback()
+            self.logger.error(f"Database error occurred during bulk upsert: {sae}")
+            raise
         except Exception as e:
-            self.logger.error(f"Error ingesting question: {e}")
+            self.logger.error(f"Error ingesting questions: {e}")
             raise
 
     def ingest_bulk(self, json_data: str):
@@ -82,16 +109,15 @@ class Ingest:
         """
         try:
             # Parse the JSON data
-            data = json.loads(json_data)
+            data = orjson.loads(json_data)
             questions = data.get('questions', [])
 
             if not questions:
                 self.logger.warning("No questions found in the provided JSON data.")
                 return
 
-            new_questions = []
-            ingested_count = 0
-            duplicate_count = 0
+            now = datetime.datetime.utcnow()
+            rows = []
             incomplete_count = 0
 
             for q in questions:
@@ -99,10 +125,7 @@ class Ingest:
                 question_text = q.get('question')
                 options = q.get('options')
                 correct_answer = q.get('correct_answer')
-                reasoning = q.get('reasoning')
                 subject = q.get('subject')
-                sub_subject = q.get('sub_subject')  # Optional
-                difficulty = q.get('difficulty')    # Optional
 
                 # Check for mandatory fields
                 if not all([question_text, options, correct_answer, subject]):
@@ -110,45 +133,38 @@ class Ingest:
                     incomplete_count += 1
                     continue  # Skip incomplete questions
 
-                # Check for duplicate based on question_text
-                existing_question = self.session.query(Question).filter_by(question_text=question_text).first()
-                if existing_question:
-                    self.logger.info(f"Duplicate found. Skipping question: {question_text}")
-                    duplicate_count += 1
-                    continue  # Skip duplicate
-
-                # Create a new Question instance
-                new_question = Question(
-                    question_text=question_text,
-                    options=json.dumps(options),  # Store options as JSON string
-                    correct_option=correct_answer,
-                    subject=subject,
-                    sub_subject=sub_subject,
-                    difficulty=difficulty,
-                    reasoning=reasoning,
-                    created_at=datetime.datetime.utcnow(),
-                    updated_at=datetime.datetime.utcnow()
-                )
-
-                new_questions.append(new_question)
-                ingested_count += 1
-
-                # Bulk insert in batches
-                if len(new_questions) >= self.batch_size:
-                    self.session.bulk_save_objects(new_questions)
-                    self.session.commit()
-                    self.logger.info(f"Ingested {len(new_questions)} questions in bulk.")
-                    new_questions = []
-
-            # Insert any remaining questions
-            if new_questions:
-                self.session.bulk_save_objects(new_questions)
+                rows.append({
+                    'question_text': question_text,
+                    'options': orjson.dumps(options).decode(),  # Store options as JSON string
+                    'correct_option': correct_answer,
+                    'subject': subject,
+                    'sub_subject': q.get('sub_subject'),  # Optional
+                    'difficulty': q.get('difficulty'),    # Optional
+                    'reasoning': q.get('reasoning'),
+                    'created_at': now,
+                    'updated_at': now
+                })
+
+            if not rows:
+                self.logger.warning("No complete questions to ingest.")
+                return
+
+            # One upsert per batch: the unique index on question_text drops
+            # duplicates in the database, replacing the per-row SELECT
+            ingested_count = 0
+            for i in range(0, len(rows), self.batch_size):
+                batch = rows[i:i + self.batch_size]
+                stmt = insert(Question).values(batch).on_conflict_do_nothing(
+                    index_elements=['question_text']
+                ).returning(Question.id)
+                ingested_count += len(self.session.execute(stmt).fetchall())
                 self.session.commit()
-                self.logger.info(f"Ingested {len(new_questions)} questions in bulk.")
+                self.logger.info(f"Ingested batch of {len(batch)} questions in bulk.")
 
+            duplicate_count = len(rows) - ingested_count
             self.logger.info(f"Bulk ingestion completed. Total ingested: {ingested_count}, Duplicates skipped: {duplicate_count}, Incomplete skipped: {incomplete_count}")
 
-        except json.JSONDecodeError as jde:
+        except orjson.JSONDecodeError as jde:
             self.logger.error(f"JSON decoding failed: {jde}")
         except SQLAlchemyError as sae:
             self.session.rollback()
@@ -1,6 +1,7 @@
 # models.py
 from sqlalchemy import (
-    Column, Integer, String, Text, Float, DateTime, ForeignKey
+    Boolean, Column, Integer, SmallInteger, String, Text, Float, DateTime,
+    ForeignKey, Index, UniqueConstraint, func, text
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -11,10 +12,10 @@ Base = declarative_base()
 
 class Question(Base):
     __tablename__ = 'questions'
-    
+
     # Define columns for the questions table
     id = Column(Integer, primary_key=True)
-    question_text = Column(Text, nullable=False, unique=True)
+    question_text = Column(Text, nullable=False)
     options = Column(Text, nullable=False)  # Stored as JSON string
     correct_option = Column(String(255), nullable=False)
     subject = Column(String(100), nullable=False)
@@ -27,6 +28,16 @@ class Question(Base):
     # Relationship with UserPerformance
     performance = relationship("UserPerformance", back_populates="question", uselist=False)
 
+    # Named unique constraint backs the ON CONFLICT upserts in ingest and
+    # makes duplicate lookups an index probe instead of a sequential scan
+    __table_args__ = (
+        UniqueConstraint('question_text', name='uq_questions_question_text'),
+        # Subject listing and filters hit this column on every session start
+        Index('ix_questions_subject', 'subject'),
+        # Serves the case-insensitive equality filter in select_questions
+        Index('ix_questions_subject_lower', func.lower(subject)),
+    )
+
 class UserPerformance(Base):
     __tablename__ = 'user_performance'
     
@@ -44,6 +55,23 @@ class UserPerformance(Base):
     # New fields for trend analysis
     previous_times_correct = Column(Integer, default=0)
     previous_average_response_time = Column(Float, default=0.0)  # In seconds
+
+    # Denormalized report columns, kept in sync by SessionManager.update_performance,
+    # so report queries can GROUP BY/SUM them directly instead of re-deriving
+    # per row: was_correct mirrors times_correct > 0, difficulty_bucket maps
+    # current_rank to 0=easy (<0.5), 1=medium (<1.5), 2=hard
+    was_correct = Column(Boolean, default=False)
+    difficulty_bucket = Column(SmallInteger, default=1)
     
     # Relationship with Question
     question = relationship("Question", back_populates="performance")
+
+    # Session queries filter on date(last_seen), which a plain last_seen
+    # btree cannot serve; the functional index turns those sequential scans
+    # into index scans. The next_review index backs the due-count query.
+    __table_args__ = (
+        Index('ix_user_perf_last_seen_date', func.date(last_seen)),
+        Index('ix_user_perf_next_review', next_review),
+        Index('ix_user_perf_correct', was_correct, postgresql_where=text('was_correct')),
+        Index('ix_user_perf_bucket', difficulty_bucket),
+    )
@@ -1,14 +1,101 @@
 # session.py (Complete SessionManager class with updated present_question method)
 
+import functools
 import json
 import datetime
 import logging
+import operator
 import time
+from sqlalchemy import case, func, or_
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager
 from models import Question, UserPerformance
 import random
 
+# Wrapper quotes/brackets stripped from stored option strings
+_STRIP_CHARS = '"\'[]\\'
+
+# Option labels; a module-level string is indexable, immutable and never
+# rebuilt per presentation (supports up to eight options)
+_OPTION_LABELS = 'ABCDEFGH'
+
+# Server-side "now" in UTC: last_seen/next_review hold naive-UTC values
+# (datetime.utcnow), so comparisons must not drift with the server's
+# TimeZone setting the way bare now() would
+_UTC_NOW = func.timezone('UTC', func.now())
+
+@functools.lru_cache(maxsize=4096)
+def _clean_text(raw):
+    """Strip whitespace and wrapper quotes/brackets from a stored string (cached)."""
+    return raw.strip().strip(_STRIP_CHARS)
+
+@functools.lru_cache(maxsize=4096)
+def _parse_options(raw):
+    """
+    Parse a stored options string into a cleaned tuple of option texts.
+
+    Cached on the raw string: the same row re-presented (retries within a
+    session, repeat questions across sessions) skips the JSON parse and
+    per-option normalization entirely.
+    """
+    cleaned = raw.strip('"\'')
+    try:
+        options = json.loads(cleaned)
+    except json.JSONDecodeError:
+        # If JSON parsing fails, try splitting by comma
+        options = [opt.strip() for opt in cleaned.split(',') if opt.strip()]
+    if not isinstance(options, list):
+        options = list(options)
+    return tuple(
+        _clean_text(opt) if isinstance(opt, str) else opt
+        for opt in options
+    )
+
+@functools.lru_cache(maxsize=8192)
+def _score(times_correct, avg_response_time, time_factor, rank, times_seen,
+           prev_correct, prev_response_time,
+           weight_correct, weight_response_time, weight_time,
+           weight_rank, weight_trend, inv_max_response_time):
+    """
+    Pure score arithmetic, memoized on the performance row's fields.
+
+    Answering a question updates times_seen and the recency-derived
+    time_factor, which changes the cache key, so stale entries invalidate
+    themselves; unchanged rows hit the cache and skip the arithmetic
+    entirely. The caller computes time_factor from the clock — keeping
+    the function free of hidden time dependence is what makes the cache
+    key cover everything the result depends on. The normalizers come in
+    as reciprocals so the hot path multiplies instead of divides.
+    """
+    correctness_factor = 1 / (times_correct + 1)
+    response_time_factor = avg_response_time * inv_max_response_time
+
+    if times_seen > 1 and prev_correct > 0:
+        change_correctness = (times_correct / times_seen
+                              - prev_correct / (times_seen - 1))
+    else:
+        change_correctness = 0
+    if times_seen > 1 and prev_response_time > 0:
+        change_response_time = ((prev_response_time - avg_response_time)
+                                / (prev_response_time + 1))
+    else:
+        change_response_time = 0
+    trend_factor = change_correctness + change_response_time
+
+    return (correctness_factor * weight_correct +
+            response_time_factor * weight_response_time +
+            time_factor * weight_time -
+            rank * weight_rank +
+            trend_factor * weight_trend)
+
+def _rank_bucket(rank):
+    """Map a rank to its denormalized difficulty bucket (0=easy, 1=medium, 2=hard)."""
+    if rank < 0.5:
+        return 0
+    if rank < 1.5:
+        return 1
+    return 2
+
 class SessionManager:
     def __init__(self, session: Session, max_response_time=60, max_days=30,
                  weight_correct=1.0, weight_response_time=0.5, weight_time=0.5, weight_rank=0.1, weight_trend=2.0):
@@ -28,6 +115,10 @@ class SessionManager:
         self.session = session
         self.max_response_time = max_response_time
         self.max_days = max_days
+        # Precomputed reciprocals: the scoring paths multiply by these
+        # instead of dividing per question
+        self._inv_max_response_time = 1.0 / max_response_time
+        self._inv_max_days = 1.0 / max_days
         self.weight_correct = weight_correct
         self.weight_response_time = weight_response_time
         self.weight_time = weight_time
@@ -46,55 +137,26 @@ class SessionManager:
         Returns:
         - float: Calculated score.
         """
-        # Calculate time since last review in days
-        if perf.last_seen:
-            time_since_last_review = (datetime.datetime.utcnow() - perf.last_seen).total_seconds() / 86400  # Convert to days
-        else:
-            time_since_last_review = self.max_days  # New questions have highest priority
-
-        # Normalize factors
-        times_correct = perf.times_correct
-        times_incorrect = perf.times_incorrect
-        avg_response_time = perf.average_response_time
-        time_since_last_review = min(time_since_last_review, self.max_days)
-
-        # Correctness factor: More correct answers lower the score
-        correctness_factor = 1 / (times_correct + 1)
-
-        # Response time factor: Faster responses lower the score
-        response_time_factor = avg_response_time / self.max_response_time
-
-        # Time factor: More time since last review lowers the score
-        time_factor = time_since_last_review / self.max_days
-
-        # Rank factor: Higher rank increases the score
-        rank_factor = perf.current_rank
-
-        # **Trend Factor Calculation**
-        if perf.times_seen > 1 and perf.previous_times_correct > 0:
-            current_correctness = times_correct / perf.times_seen
-            previous_correctness = perf.previous_times_correct / (perf.times_seen - 1)
-            change_correctness = current_correctness - previous_correctness
-        else:
-            change_correctness = 0  # No previous data to compare
-
-        if perf.times_seen > 1 and perf.previous_average_response_time > 0:
-            change_response_time = (perf.previous_average_response_time - avg_response_time) / (perf.previous_average_response_time + 1)
+        # The recency factor depends on the clock, so it is computed here
+        # and passed in; the memoized arithmetic stays pure and its cache
+        # key covers every input
+        if perf.last_seen is not None:
+            time_since = (datetime.datetime.utcnow() - perf.last_seen).total_seconds() / 86400
+            time_factor = min(time_since * self._inv_max_days, 1.0)
         else:
-            change_response_time = 0  # No previous data to compare
-
-        trend_factor = change_correctness + change_response_time
-
-        # Calculate total score
-        score = (correctness_factor * self.weight_correct +
-                 response_time_factor * self.weight_response_time +
-                 time_factor * self.weight_time -
-                 (rank_factor * self.weight_rank) +
-                 (trend_factor * self.weight_trend))
-
-        return score
+            time_factor = 1.0  # New questions have the full time factor
+
+        return _score(
+            perf.times_correct, perf.average_response_time, time_factor,
+            perf.current_rank, perf.times_seen,
+            perf.previous_times_correct, perf.previous_average_response_time,
+            self.weight_correct, self.weight_response_time, self.weight_time,
+            self.weight_rank, self.weight_trend,
+            self._inv_max_response_time
+        )
 
-    def select_questions(self, num_questions=20, subject=None, sub_subject=None, random_selection=False):
+    def select_questions(self, num_questions=20, subject=None, sub_subject=None,
+                         random_selection=False, fuzzy=False):
         """
         Select a set of questions based on the scoring algorithm.
 
@@ -103,40 +165,100 @@ class SessionManager:
         - subject (str): Subject filter.
         - sub_subject (str): Sub-subject filter.
         - random_selection (bool): If True, select questions randomly without scoring.
+        - fuzzy (bool): If True, match subjects by substring instead of equality.
 
         Returns:
         - list of Question: Selected questions for the session.
         """
         query = self.session.query(Question)
 
-        # Apply subject filters if specified
+        # Apply subject filters if specified. The menu offers subjects taken
+        # verbatim from the database, so the default is a case-insensitive
+        # equality check the lower(subject) index can serve; the leading-%
+        # ILIKE (which forces a sequential scan) is kept behind fuzzy=True
+        # for callers passing free-form text.
         if subject:
-            query = query.filter(Question.subject.ilike(f"%{subject}%"))
+            if fuzzy:
+                query = query.filter(Question.subject.ilike(f"%{subject}%"))
+            else:
+                query = query.filter(func.lower(Question.subject) == subject.lower())
         if sub_subject:
-            query = query.filter(Question.sub_subject.ilike(f"%{sub_subject}%"))
-
-        # Join with UserPerformance
-        query = query.outerjoin(UserPerformance).options()
-
-        questions = query.all()
-
-        scored_questions = []
-        for q in questions:
-            if q.performance:
-                score = self.calculate_score(q.performance)
+            if fuzzy:
+                query = query.filter(Question.sub_subject.ilike(f"%{sub_subject}%"))
             else:
-                # If the question has never been seen, prioritize it
-                score = 0  # Highest priority
-            scored_questions.append((q, score))
+                query = query.filter(func.lower(Question.sub_subject) == sub_subject.lower())
+
+        # Join through the relationship and populate Question.performance
+        # from the same LEFT OUTER JOIN the scoring uses, so neither the
+        # session loop nor update_performance triggers a lazy SELECT per
+        # question later
+        query = query.outerjoin(Question.performance).options(
+            contains_eager(Question.performance)
+        )
 
         if random_selection:
-            # Shuffle and select randomly
-            random.shuffle(scored_questions)
-            selected = [q for q, s in scored_questions[:num_questions]]
-        else:
-            # Sort by score ascending and pick top N
-            scored_questions.sort(key=lambda x: x[1])
-            selected = [q for q, s in scored_questions[:num_questions]]
+            # Let Postgres pick the sample; only num_questions rows cross
+            # the wire instead of the whole bank
+            selected = query.order_by(func.random()).limit(num_questions).all()
+            self.logger.info(f"Selected {len(selected)} questions for the session.")
+            return selected
+
+        # Spaced repetition only needs the due set: never-seen questions
+        # (no performance row) and those whose next_review has arrived.
+        # The next_review index keeps this an index probe, so scoring no
+        # longer touches questions scheduled far in the future.
+        query = query.filter(or_(
+            UserPerformance.next_review.is_(None),
+            UserPerformance.next_review <= _UTC_NOW
+        ))
+
+        # Express calculate_score as SQL so Postgres scores every row and
+        # returns only the top N; the question bank never crosses the wire.
+        # coalesce handles questions with no performance row inside the
+        # arithmetic, and the outer CASE pins those rows to score 0
+        # (highest priority), matching the original Python behaviour.
+        times_correct = func.coalesce(UserPerformance.times_correct, 0)
+        avg_response_time = func.coalesce(UserPerformance.average_response_time, 0.0)
+        times_seen = func.coalesce(UserPerformance.times_seen, 0)
+        prev_correct = func.coalesce(UserPerformance.previous_times_correct, 0)
+        prev_response_time = func.coalesce(UserPerformance.previous_average_response_time, 0.0)
+        rank = func.coalesce(UserPerformance.current_rank, 1.0)
+
+        correctness_factor = 1.0 / (times_correct + 1.0)
+        response_time_factor = avg_response_time * self._inv_max_response_time
+        days_since_seen = func.least(
+            func.coalesce(
+                func.extract('epoch', _UTC_NOW - UserPerformance.last_seen) / 86400.0,
+                self.max_days
+            ),
+            self.max_days
+        )
+        time_factor = days_since_seen * self._inv_max_days
+
+        # * 1.0 forces float division; Postgres would otherwise divide the
+        # integer counters integrally
+        change_correctness = case(
+            ((times_seen > 1) & (prev_correct > 0),
+             times_correct * 1.0 / times_seen - prev_correct * 1.0 / (times_seen - 1)),
+            else_=0.0
+        )
+        change_response_time = case(
+            ((times_seen > 1) & (prev_response_time > 0),
+             (prev_response_time - avg_response_time) / (prev_response_time + 1.0)),
+            else_=0.0
+        )
+        trend_factor = change_correctness + change_response_time
+
+        score = case(
+            (UserPerformance.id.is_(None), 0.0),
+            else_=(correctness_factor * self.weight_correct +
+                   response_time_factor * self.weight_response_time +
+                   time_factor * self.weight_time -
+                   rank * self.weight_rank +
+                   trend_factor * self.weight_trend)
+        )
+
+        selected = query.order_by(score.asc()).limit(num_questions).all()
 
         self.logger.info(f"Selected {len(selected)} questions for the session.")
         return selected
@@ -156,55 +278,44 @@ class SessionManager:
         print(question.question_text)
         print("\nOptions:")
 
-        # Parse options from JSON string if necessary
+        # Parse (and clean) options once per distinct string; cache hits
+        # make the retry path O(1)
         try:
             if isinstance(question.options, str):
-                # Remove any surrounding quotes and clean the string
-                cleaned_options = question.options.strip('"\'')
-                # Try parsing as JSON
-                try:
-                    options = json.loads(cleaned_options)
-                except json.JSONDecodeError:
-                    # If JSON parsing fails, try splitting by comma
-                    options = [opt.strip() for opt in cleaned_options.split(',') if opt.strip()]
+                options = list(_parse_options(question.options))
             else:
-                options = question.options
-
-            if not isinstance(options, list):
-                options = list(options)
-
+                options = list(question.options)
         except Exception as e:
             self.logger.error(f"Failed to parse options: {question.options}. Error: {e}")
             options = []  # Fallback to empty list
 
-        # Create a copy of the parsed options list
-        shuffled_options = options.copy()
+        # The list() copies above keep the cached tuple intact
+        shuffled_options = options
         random.shuffle(shuffled_options)  # Shuffle in place
 
-        # Assign labels to options
-        option_labels = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']  # Support more options if needed
-        labeled_options = list(zip(option_labels[:len(shuffled_options)], shuffled_options))
-
-        # Display shuffled options with labels
-        for label, option in labeled_options:
-            print(f"  {label}. {option.strip().strip('"\'[]\\')}")
-        
-        # Collect user answer with response time
+        # Display shuffled options with labels (already normalized at parse)
+        for i, option in enumerate(shuffled_options):
+            print(f"  {_OPTION_LABELS[i]}. {option}")
+
+        # Collect user answer with response time. Invalid input only
+        # re-prompts: no recursion, no re-parse/re-shuffle/re-print per bad
+        # keystroke. The clock runs from the first prompt, so time spent on
+        # invalid attempts counts toward the response time. Labels are
+        # contiguous letters, so the answer indexes straight into the
+        # shuffled list — no label mapping to build or search.
+        num_options = len(shuffled_options)
         start_time = time.time()
-        user_input = input("\nEnter the option letter (e.g., A): ").strip().upper()
-        end_time = time.time()
-        response_time = end_time - start_time
-
-        # Validate user input
-        valid_labels = [label for label, _ in labeled_options]
-        if user_input not in valid_labels:
+        while True:
+            user_input = input("\nEnter the option letter (e.g., A): ").strip().upper()
+            idx = ord(user_input) - ord('A') if len(user_input) == 1 else -1
+            if 0 <= idx < num_options:
+                break
             print("Invalid option selected. Please try again.")
-            return self.present_question(question)  # Retry the same question
+        response_time = time.time() - start_time
 
         # Retrieve the selected option based on user input
-        selected_option = dict(labeled_options).get(user_input)
-        selected_option = selected_option.strip().strip('"\'[]\\')
-        correct_option = question.correct_option.strip().strip('"\'[]\\')
+        selected_option = shuffled_options[idx]
+        correct_option = _clean_text(question.correct_option)
         is_correct = (selected_option == correct_option)
 
         if is_correct:
@@ -228,7 +339,8 @@ class SessionManager:
         - None
         """
         try:
-            perf = self.session.query(UserPerformance).filter_by(question_id=question.id).first()
+            # Already populated by select_questions' eager load; no query
+            perf = question.performance
             now = datetime.datetime.utcnow()
             
             if not perf:
@@ -246,31 +358,38 @@ class SessionManager:
                     next_review=now + datetime.timedelta(days=interval),
                     current_rank=initial_rank,
                     previous_times_correct=0,
-                    previous_average_response_time=0.0
+                    previous_average_response_time=0.0,
+                    was_correct=is_correct,
+                    difficulty_bucket=_rank_bucket(initial_rank)
                 )
-                self.session.add(perf)
-                self.logger.debug(f"Created new UserPerformance for question ID {question.id}")
+                # Assigning through the relationship both adds the row to the
+                # session and keeps question.performance current in memory
+                question.performance = perf
+                # %-style args defer formatting until debug is actually on
+                self.logger.debug("Created new UserPerformance for question ID %s", question.id)
             else:
                 # Update previous performance metrics
                 perf.previous_times_correct = perf.times_correct
                 perf.previous_average_response_time = perf.average_response_time
 
-                # Update current performance metrics
+                # Update current performance metrics (times_seen cached in a
+                # local: the ratios below reuse it without re-reading the
+                # instrumented attribute)
                 perf.last_seen = now
-                perf.times_seen += 1
+                perf.times_seen = times_seen = perf.times_seen + 1
                 if is_correct:
                     perf.times_correct += 1
                 else:
                     perf.times_incorrect += 1
 
-                # Update average response time with weighted average
-                perf.average_response_time = (
-                    (perf.average_response_time * (perf.times_seen - 1) + response_time) / 
-                    perf.times_seen
+                # Incremental (Welford-style) running mean: one divide, and
+                # numerically stable as times_seen grows
+                perf.average_response_time += (
+                    (response_time - perf.average_response_time) / times_seen
                 )
 
                 # Calculate performance trend
-                correctness_ratio = perf.times_correct / perf.times_seen
+                correctness_ratio = perf.times_correct / times_seen
                 response_time_improvement = (
                     (perf.previous_average_response_time - perf.average_response_time) / 
                     perf.previous_average_response_time if perf.previous_average_response_time > 0 else 0
@@ -291,18 +410,24 @@ class SessionManager:
                 interval = self.calculate_interval(perf.current_rank, correct=is_correct)
                 perf.next_review = now + datetime.timedelta(days=interval)
 
-                self.logger.debug(f"Updated UserPerformance for question ID {question.id}")
-            
-            self.session.commit()
-            self.logger.info(f"Updated performance for question ID {question.id}")
-            
-            # Log detailed performance metrics
-            self.logger.debug(
-                f"Performance metrics for question {question.id}: "
-                f"Rank={perf.current_rank:.2f}, "
-                f"Next review in {interval} days, "
-                f"Correct ratio={perf.times_correct/perf.times_seen:.2%}"
-            )
+                # Keep the denormalized report columns in sync
+                perf.was_correct = perf.times_correct > 0
+                perf.difficulty_bucket = _rank_bucket(perf.current_rank)
+
+                self.logger.debug("Updated UserPerformance for question ID %s", question.id)
+
+            # No commit here: start_session commits the whole session once,
+            # so answering a question costs no transaction round-trip
+
+            # Log detailed performance metrics; the ratio division only
+            # runs when debug logging is enabled
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(
+                    "Performance metrics for question %s: Rank=%.2f, "
+                    "Next review in %s days, Correct ratio=%.2f%%",
+                    question.id, perf.current_rank, interval,
+                    100 * perf.times_correct / perf.times_seen
+                )
             
         except SQLAlchemyError as sae:
             self.session.rollback()
@@ -387,12 +512,12 @@ class SessionManager:
                 session_stats['by_subject'][subject] = {
                     'total': 0,
                     'correct': 0,
-                    'times': []
+                    'sum_time': 0.0
                 }
-            
+
             session_stats['by_subject'][subject]['total'] += 1
             session_stats['by_subject'][subject]['correct'] += int(is_correct)
-            session_stats['by_subject'][subject]['times'].append(response_time)
+            session_stats['by_subject'][subject]['sum_time'] += response_time
 
             # Store question data
             session_stats['questions_data'].append({
@@ -402,6 +527,14 @@ class SessionManager:
                 'response_time': response_time
             })
 
+        # One commit (and one fsync) for the whole session instead of a
+        # transaction per answered question
+        try:
+            self.session.commit()
+        except SQLAlchemyError as sae:
+            self.session.rollback()
+            self.logger.error(f"Database error occurred while saving session results: {sae}")
+
         # Generate and display session report
         self._display_session_report(session_stats)
 
@@ -430,34 +563,36 @@ class SessionManager:
         print("\nPerformance by Subject:")
         print("-" * 40)
         
-        # Sort subjects by performance (descending)
-        subject_performance = []
+        # Partition into strong/weak in one pass over the running per-subject
+        # accumulators, then sort each bucket by accuracy (descending) with a
+        # C-level key instead of a Python lambda
+        by_accuracy = operator.itemgetter(1)
+        strong, weak = [], []
         for subject, data in stats['by_subject'].items():
             accuracy = (data['correct'] / data['total']) * 100
-            avg_time = sum(data['times']) / len(data['times'])
-            subject_performance.append((subject, accuracy, avg_time, data['total']))
-        
-        # Sort by accuracy (descending)
-        subject_performance.sort(key=lambda x: x[1], reverse=True)
+            # Running sum accumulated during the session; no list to re-scan
+            avg_time = data['sum_time'] / data['total']
+            row = (subject, accuracy, avg_time, data['total'])
+            (strong if accuracy >= 70 else weak).append(row)
+        strong.sort(key=by_accuracy, reverse=True)
+        weak.sort(key=by_accuracy, reverse=True)
 
         # Display subject performance
         print("\nStrong Subjects (>= 70% accuracy):")
         print("-" * 40)
-        for subject, accuracy, avg_time, total in subject_performance:
-            if accuracy >= 70:
-                print(f"{subject}:")
-                print(f"  Accuracy: {accuracy:.1f}%")
-                print(f"  Average Response Time: {avg_time:.1f} seconds")
-                print(f"  Questions Attempted: {total}")
+        for subject, accuracy, avg_time, total in strong:
+            print(f"{subject}:")
+            print(f"  Accuracy: {accuracy:.1f}%")
+            print(f"  Average Response Time: {avg_time:.1f} seconds")
+            print(f"  Questions Attempted: {total}")
 
         print("\nSubjects Needing Improvement (< 70% accuracy):")
         print("-" * 40)
-        for subject, accuracy, avg_time, total in subject_performance:
-            if accuracy < 70:
-                print(f"{subject}:")
-                print(f"  Accuracy: {accuracy:.1f}%")
-                print(f"  Average Response Time: {avg_time:.1f} seconds")
-                print(f"  Questions Attempted: {total}")
+        for subject, accuracy, avg_time, total in weak:
+            print(f"{subject}:")
+            print(f"  Accuracy: {accuracy:.1f}%")
+            print(f"  Average Response Time: {avg_time:.1f} seconds")
+            print(f"  Questions Attempted: {total}")
 
         # Detailed Question Analysis
         print("\nDetailed Question Analysis:")